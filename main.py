@@ -1,13 +1,26 @@
 import os
-import json
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+import asyncio
+import ijson
+import orjson
+from datetime import timedelta
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from services.hal import get_hal_stats, get_project_stats, get_listic_stats
-from services.dblp import get_dblp_stats
+from services.hal import get_hal_stats, get_project_stats, get_listic_stats, close_hal_client
+from services.dblp import get_dblp_stats, close_dblp_client
+from services.cache import get_or_fetch, utcnow, encode_payload, decode_payload
 
-app = FastAPI(title="LISTIC Dashboard API")
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with orjson. Defined here because fastapi.responses.ORJSONResponse
+    is deprecated. OPT_NON_STR_KEYS keeps the int-keyed year distributions serializable.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(title="LISTIC Dashboard API", default_response_class=ORJSONResponse)
 
 # Environment variables
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
@@ -17,10 +30,30 @@ DB_NAME = "listic_db"
 DATA_PATH = os.getenv("DATA_PATH_RESEARCHERS", "/home/skudo/Desktop/LISTIC/listic-database/listic personnes/listic_personnes.complete_structure.json")
 DATA_PATH_PROJECTS = os.getenv("DATA_PATH_PROJECTS", "/home/skudo/Desktop/LISTIC/listic-database/listic_projet/listic_projets.complete_structure.json")
 
+# Fields returned by the listing endpoints (full documents come from the detail routes)
+RESEARCHER_LIST_FIELDS = {"_id": 0, "name": 1, "category": 1, "_unique_id": 1, "photo": 1}
+PROJECT_LIST_FIELDS = {"_id": 0, "NOM": 1, "type": 1, "_unique_id": 1}
+
+# Default and upper bound of the `limit` paging parameter of the listing endpoints
+MAX_PAGE_SIZE = 1000
+
+# Max concurrent researchers processed by precompute_researcher_stats
+PRECOMPUTE_CONCURRENCY = 20
+
+# Age (seconds) after which precomputed stats are no longer served, same as the api_cache TTL
+STATS_MAX_AGE = 86400
+# The background refresh runs this often and recomputes stats past half of STATS_MAX_AGE,
+# so entries are renewed well before /researcher/{uid} stops serving them
+STATS_REFRESH_INTERVAL = 3600
+STATS_REFRESH_AGE = STATS_MAX_AGE // 2
+
 # Database client
 client = None
 db = None
 
+# Keeps a reference to the background refresh task so it is not garbage collected
+precompute_task = None
+
 # CORS setup
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +63,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Number of documents sent per insert_many call while seeding
+SEED_BATCH_SIZE = 1000
+
+def iter_seed_records(path: str, tag_field: str, id_field: str):
+    """
+    Streams the records of a `*.complete_structure.json` file one category at a time,
+    tagging each with its category and a `_unique_id`.
+    """
+    with open(path, "rb") as f:
+        # The export is either the root object itself or a list wrapping it
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        prefix = "item.data" if first == b"[" else "data"
+
+        # use_float avoids Decimal values, which BSON cannot encode
+        for category, records in ijson.kvitems(f, prefix, use_float=True):
+            if isinstance(records, list):
+                for r in records:
+                    if isinstance(r, dict):
+                        r[tag_field] = category
+                        if "_unique_id" not in r:
+                            r["_unique_id"] = r.get(id_field)
+                        yield r
+
+async def insert_in_batches(collection, records) -> int:
+    """
+    Inserts records in chunks of SEED_BATCH_SIZE and returns the number inserted.
+    Batches are unordered and skip document validation since seed data is trusted.
+    """
+    inserted = 0
+    batch = []
+    for r in records:
+        batch.append(r)
+        if len(batch) >= SEED_BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+        inserted += len(batch)
+    return inserted
+
 async def seed_data():
     """Reads JSON files and populates MongoDB if collections are empty."""
     
@@ -38,24 +115,9 @@ async def seed_data():
         if os.path.exists(DATA_PATH):
             try:
                 print(f"Seeding researchers from {DATA_PATH}...")
-                with open(DATA_PATH, "r", encoding="utf-8") as f:
-                    raw_data = json.load(f)
-                    all_persons = []
-                    root = raw_data[0] if isinstance(raw_data, list) and len(raw_data) > 0 else raw_data
-                    data_content = root.get("data", {})
-                    
-                    for category, persons in data_content.items():
-                        if isinstance(persons, list):
-                            for p in persons:
-                                if isinstance(p, dict):
-                                    p["category"] = category
-                                    if "_unique_id" not in p:
-                                        p["_unique_id"] = p.get("name")
-                                    all_persons.append(p)
-                
-                if all_persons:
-                    await db.researchers.insert_many(all_persons)
-                    print(f"Inserted {len(all_persons)} researchers.")
+                count = await insert_in_batches(db.researchers, iter_seed_records(DATA_PATH, "category", "name"))
+                if count:
+                    print(f"Inserted {count} researchers.")
             except Exception as e:
                 print(f"Error seeding researchers: {e}")
         else:
@@ -66,44 +128,112 @@ async def seed_data():
         if os.path.exists(DATA_PATH_PROJECTS):
             try:
                 print(f"Seeding projects from {DATA_PATH_PROJECTS}...")
-                with open(DATA_PATH_PROJECTS, "r", encoding="utf-8") as f:
-                    raw_projects = json.load(f)
-                    root_proj = raw_projects[0] if isinstance(raw_projects, list) and len(raw_projects) > 0 else raw_projects
-                    data_content_proj = root_proj.get("data", {})
-                    
-                    all_projects_list = []
-                    for cat, projs in data_content_proj.items():
-                        if isinstance(projs, list):
-                            for p in projs:
-                                if isinstance(p, dict):
-                                    p["type"] = cat
-                                    # Ensure unique ID
-                                    if "_unique_id" not in p:
-                                        p["_unique_id"] = p.get("NOM")
-                                    all_projects_list.append(p)
-                    
-                    if all_projects_list:
-                        await db.projects.insert_many(all_projects_list)
-                        print(f"Inserted {len(all_projects_list)} projects.")
+                count = await insert_in_batches(db.projects, iter_seed_records(DATA_PATH_PROJECTS, "type", "NOM"))
+                if count:
+                    print(f"Inserted {count} projects.")
             except Exception as e:
                 print(f"Error seeding projects: {e}")
         else:
             print(f"Projects file not found: {DATA_PATH_PROJECTS}")
 
+# (collection, keys, options) of the indexes created at startup
+INDEX_SPECS = [
+    ("researchers", "_unique_id", {"unique": True}),
+    ("researchers", "name", {}),
+    ("researchers", "category", {}),
+    ("projects", "_unique_id", {"unique": True}),
+    ("projects", "NOM", {}),
+    # Drop persisted HAL/DBLP responses after a week
+    ("api_cache", "fetched_at", {"expireAfterSeconds": 604800}),
+]
+
+async def ensure_indexes():
+    """
+    Creates the indexes backing the researcher/project lookups (no-op if they exist).
+    Each index is created on its own so one failure (e.g. duplicate `_unique_id` in the
+    seed data) does not skip the others.
+    """
+    for coll, keys, options in INDEX_SPECS:
+        try:
+            await db[coll].create_index(keys, **options)
+        except Exception as e:
+            print(f"Error creating index {coll}.{keys}: {e}")
+
+async def precompute_researcher_stats():
+    """
+    Fetches the unfiltered HAL/DBLP stats of every researcher that has none stored, or
+    whose stats are older than STATS_REFRESH_AGE, and saves them on the researcher document
+    (`stats_cached`, `stats_cached_at`), so /researcher/{uid} can answer from a single find_one.
+    """
+    sem = asyncio.Semaphore(PRECOMPUTE_CONCURRENCY)
+
+    async def compute(uid, name):
+        async with sem:
+            hal_data, dblp_data = await asyncio.gather(get_hal_stats(name), get_dblp_stats(name))
+        if "error" in hal_data or "error" in dblp_data:
+            return
+        stats = encode_payload({"hal": hal_data, "dblp": dblp_data})
+        await db.researchers.update_one(
+            {"_unique_id": uid},
+            {"$set": {"stats_cached": stats, "stats_cached_at": utcnow()}}
+        )
+
+    try:
+        stale = {"$or": [
+            {"stats_cached": {"$exists": False}},
+            {"stats_cached_at": {"$not": {"$gte": utcnow() - timedelta(seconds=STATS_REFRESH_AGE)}}}
+        ]}
+        cursor = db.researchers.find(stale, {"_id": 0, "_unique_id": 1, "name": 1})
+        persons = await cursor.to_list(length=None)
+        await asyncio.gather(*(compute(p["_unique_id"], p["name"]) for p in persons if p.get("name")))
+        if persons:
+            print(f"Precomputed stats for {len(persons)} researchers.")
+    except Exception as e:
+        print(f"Error precomputing researcher stats: {e}")
+
+async def refresh_researcher_stats():
+    """Runs precompute_researcher_stats at startup, then every STATS_REFRESH_INTERVAL seconds."""
+    while True:
+        await precompute_researcher_stats()
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+
 @app.on_event("startup")
 async def startup_event():
-    global client, db
+    global client, db, precompute_task
     client = AsyncIOMotorClient(MONGODB_URL)
     db = client[DB_NAME]
     await seed_data()
+    await ensure_indexes()
+    # Runs in the background: startup should not wait on HAL/DBLP for every researcher
+    precompute_task = asyncio.create_task(refresh_researcher_stats())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if precompute_task and not precompute_task.done():
+        precompute_task.cancel()
     if client:
         client.close()
+    await close_hal_client()
+    await close_dblp_client()
+
+async def find_by_uid(collection, uid: str, fallback_field: str):
+    """
+    Looks a document up by `_unique_id`, falling back to `fallback_field` (name/NOM),
+    in a single round trip. A `_unique_id` match takes precedence over a fallback match.
+    """
+    cursor = collection.find({"$or": [{"_unique_id": uid}, {fallback_field: uid}]}, {"_id": 0})
+    docs = await cursor.to_list(length=None)
+    for d in docs:
+        if d.get("_unique_id") == uid:
+            return d
+    return docs[0] if docs else None
+
+# Routes: handlers that await Motor/HAL/DBLP, or do trivial non-blocking work, are `async def`.
+# Only blocking (sync I/O or heavy CPU) handlers should be plain `def`: FastAPI runs those in
+# its bounded threadpool, while a blocking call inside an `async def` stalls the event loop.
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "LISTIC Dashboard API is running with MongoDB"}
 
 @app.get("/global-stats")
@@ -118,34 +248,33 @@ async def get_global_stats(start_year: Optional[int] = None, end_year: Optional[
     }
 
 @app.get("/researchers")
-async def get_researchers(category: Optional[str] = None):
+async def get_researchers(
+    category: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
     query = {}
     if category:
         query["category"] = category
     
-    # Exclude _id from result or map it
-    cursor = db.researchers.find(query, {"_id": 0})
-    return await cursor.to_list(length=1000)
+    cursor = db.researchers.find(query, RESEARCHER_LIST_FIELDS).skip(skip).limit(limit)
+    return await cursor.to_list(length=limit)
 
 @app.get("/projects")
-async def get_projects():
-    cursor = db.projects.find({}, {"_id": 0})
-    return await cursor.to_list(length=1000)
+async def get_projects(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.projects.find({}, PROJECT_LIST_FIELDS).skip(skip).limit(limit)
+    return await cursor.to_list(length=limit)
 
 @app.get("/project/{uid}")
 async def get_project_details(uid: str):
-    # Try finding by _unique_id first
-    proj = await db.projects.find_one({"_unique_id": uid}, {"_id": 0})
+    # By _unique_id, or by NOM for backward compatibility if uid is name
+    proj = await find_by_uid(db.projects, uid, "NOM")
     
-    # Fallback by NOM if not found (for backward compatibility if uid is name)
-    if not proj:
-        proj = await db.projects.find_one({"NOM": uid}, {"_id": 0})
-        
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
     
     name = proj.get("NOM")
-    hal_stats = await get_project_stats(name)
+    hal_stats = await get_or_fetch(db.api_cache, f"hal-project:{name}", lambda: get_project_stats(name))
     
     return {
         "profile": proj,
@@ -156,18 +285,33 @@ async def get_project_details(uid: str):
 
 @app.get("/researcher/{uid}")
 async def get_researcher_details(uid: str, start_year: Optional[int] = None, end_year: Optional[int] = None, keyword: Optional[str] = None):
-    person = await db.researchers.find_one({"_unique_id": uid}, {"_id": 0})
+    # By _unique_id, or by name as a fallback
+    person = await find_by_uid(db.researchers, uid, "name")
     
-    # Fallback search by name if needed
-    if not person:
-         person = await db.researchers.find_one({"name": uid}, {"_id": 0})
-         
     if not person:
         raise HTTPException(status_code=404, detail="Researcher not found")
     
+    stats_cached = person.pop("stats_cached", None)
+    stats_cached_at = person.pop("stats_cached_at", None)
+    fresh = stats_cached_at is not None and utcnow() - stats_cached_at < timedelta(seconds=STATS_MAX_AGE)
+    
+    # Unfiltered requests are served from the precomputed stats, while fresh
+    if stats_cached is not None and fresh and not (start_year or end_year or keyword):
+        return {
+            "profile": person,
+            "stats": decode_payload(stats_cached)
+        }
+    
     name = person.get("name")
-    hal_data = await get_hal_stats(name, start_year, end_year, keyword)
-    dblp_data = await get_dblp_stats(name)
+    # HAL and DBLP are independent, fetch them concurrently
+    hal_data, dblp_data = await asyncio.gather(
+        get_or_fetch(
+            db.api_cache,
+            f"hal:{name}:{start_year}:{end_year}:{keyword}",
+            lambda: get_hal_stats(name, start_year, end_year, keyword)
+        ),
+        get_or_fetch(db.api_cache, f"dblp:{name}", lambda: get_dblp_stats(name))
+    )
     
     return {
         "profile": person,
@@ -0,0 +1,76 @@
+import time
+import functools
+import orjson
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+def utcnow() -> datetime:
+    # pymongo hands back naive UTC datetimes
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def encode_payload(data) -> bytes:
+    # Stored as JSON bytes: stats dicts have int keys (years), which BSON rejects
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def decode_payload(payload: bytes):
+    return orjson.loads(payload)
+
+
+def ttl_cache(ttl: float = 600, maxsize: int = 1024, key=None):
+    """
+    In-memory TTL + LRU cache for async fetchers, keyed by call arguments
+    (or by `key(*args, **kwargs)` when given, e.g. for unhashable arguments).
+    Error payloads (dicts with an "error" key) and exceptions are not cached so a
+    transient upstream failure is retried on the next call.
+    """
+    def decorator(func):
+        entries = OrderedDict()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+
+            entry = entries.get(k)
+            if entry and entry[0] > now:
+                entries.move_to_end(k)
+                return entry[1]
+
+            result = await func(*args, **kwargs)
+            if not (isinstance(result, dict) and "error" in result):
+                entries[k] = (now + ttl, result)
+                entries.move_to_end(k)
+                if len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
+
+async def get_or_fetch(collection, key: str, fetcher, ttl: int = 86400):
+    """
+    Persistent cache backed by a MongoDB collection (`api_cache`).
+    Returns the payload stored under `key` if it is younger than `ttl` seconds,
+    otherwise awaits `fetcher()` and stores the result. When the upstream call
+    fails, a stale entry is served rather than the error.
+    """
+    now = utcnow()
+    cached = await collection.find_one({"_id": key})
+    if cached and now - cached["fetched_at"] < timedelta(seconds=ttl):
+        return decode_payload(cached["payload"])
+
+    result = await fetcher()
+    if isinstance(result, dict) and "error" in result:
+        return decode_payload(cached["payload"]) if cached else result
+
+    await collection.update_one(
+        {"_id": key},
+        {"$set": {"payload": encode_payload(result), "fetched_at": now}},
+        upsert=True
+    )
+    return result
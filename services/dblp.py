@@ -1,8 +1,29 @@
-import httpx
+import asyncio
+import heapq
+import logging
+import string
+import sys
+import orjson
 from collections import Counter
+from services.cache import ttl_cache
+from services.http import LazyClient
 
 DBLP_API_URL = "https://dblp.org/search/publ/api"
 
+logger = logging.getLogger(__name__)
+
+# Deletes all whitespace in a single str.translate pass (used to normalize author names)
+_WS = str.maketrans("", "", string.whitespace)
+
+# Shared pooled client, see services/http.py
+_http = LazyClient()
+get_client = _http.get
+close_dblp_client = _http.close
+
+# Caps concurrent DBLP requests so dashboard bursts don't trip DBLP's rate limiting
+_dblp_sem = asyncio.Semaphore(10)
+
+@ttl_cache(ttl=600)
 async def get_dblp_stats(name: str):
     """
     Fetches statistics for a researcher from DBLP API.
@@ -15,89 +36,88 @@ async def get_dblp_stats(name: str):
         "h": 500 # Max results
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(DBLP_API_URL, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            
-            hits = data.get("result", {}).get("hits", {}).get("hit", [])
-            
-            if not hits:
-                return {"found": False, "source": "DBLP", "count": 0}
+    try:
+        async with _dblp_sem:
+            response = await get_client().get(DBLP_API_URL, params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        hits = data.get("result", {}).get("hits", {}).get("hit", [])
+        
+        if not hits:
+            return {"found": False, "source": "DBLP", "count": 0}
 
-            # Process Stats
-            years = []
-            types = []
-            venue_counts = []
-            co_authors = []
-            
-            cleaned_hits = []
-            
-            # Helper to safely hashable
-            def safe_value(v):
-                if isinstance(v, list): return tuple(v)
-                return v
+        # Process Stats (one Counter per field, filled in a single pass over the hits)
+        years_c = Counter()
+        types_c = Counter()
+        venues_c = Counter()
+        co_authors = Counter()
+        
+        cleaned_hits = []
+        
+        # Helper to safely hashable
+        def safe_value(v):
+            if isinstance(v, list): return tuple(v)
+            return v
 
-            researcher_name_lower = "".join(name.split()).lower() # DBLP author names are often First Last, but let's just crude compare parts if needed, or better, exclude exact match if possible.
-            # actually DBLP returns "author" as list of dicts or strings.
+        # Normalized spellings of the researcher's own name, excluded from co-authors.
+        # DBLP author names are usually "First Last" but may come as "Last First".
+        name_parts = name.split()
+        self_variants = {
+            "".join(name_parts).casefold(),
+            "".join(reversed(name_parts)).casefold()
+        }
     
-            for hit in hits:
-                info = hit.get("info", {})
-                
-                # Check if author name matches approximately (DBLP search is broad)
-                authors_list = info.get("authors", {}).get("author", [])
-                if isinstance(authors_list, str): authors_list = [authors_list]
-                elif isinstance(authors_list, dict): authors_list = [authors_list.get("text", "")] # Sometimes complex object
-                
-                # Co-authors
-                for auth in authors_list:
-                    # Very basic exclusion of self. DBLP names might vary slightly.
-                    # Normalize simple check
-                    if auth and isinstance(auth, str):
-                        if "".join(auth.split()).lower() != researcher_name_lower:
-                            co_authors.append(auth)
-
-                year = info.get("year")
-                if year: years.append(int(year))
-                
-                type_ = info.get("type")
-                if type_: types.append(safe_value(type_))
-                
-                venue = info.get("venue")
-                if venue: 
-                    if isinstance(venue, list):
-                        venue_counts.extend(venue)
-                    else:
-                        venue_counts.append(venue)
-                
-                cleaned_hits.append({
-                    "title": info.get("title"),
-                    "year": year,
-                    "venue": venue if not isinstance(venue, list) else venue[0], # Just take first if list
-                    "type": type_ if not isinstance(type_, list) else type_[0],
-                    "url": info.get("url")
-                })
+        for hit in hits:
+            info = hit.get("info", {})
             
-            years_dist = dict(Counter(years))
-            types_dist = dict(Counter([str(t) for t in types])) # Force string for JSON
-            venues_top = dict(Counter(venue_counts).most_common(10))
-            collaborators_top = dict(Counter(co_authors).most_common(10))
+            # Check if author name matches approximately (DBLP search is broad)
+            authors_list = info.get("authors", {}).get("author", [])
+            if isinstance(authors_list, str): authors_list = [authors_list]
+            elif isinstance(authors_list, dict): authors_list = [authors_list.get("text", "")] # Sometimes complex object
             
-            # Sort cleaned hits by year desc
-            cleaned_hits.sort(key=lambda x: int(x.get("year", 0)) if x.get("year") else 0, reverse=True)
+            # Co-authors (exclude self)
+            co_authors.update(
+                a for a in authors_list
+                if a and isinstance(a, str) and a.translate(_WS).casefold() not in self_variants
+            )
 
-            return {
-                "found": True,
-                "source": "DBLP",
-                "total_publications": len(hits),
-                "years_distribution": years_dist,
-                "types_distribution": types_dist,
-                "top_venues": venues_top,
-                "top_collaborators": collaborators_top,
-                "recent_publications": cleaned_hits[:5]
-            }
+            year = info.get("year")
+            if year: years_c[int(year)] += 1
             
-        except Exception as e:
-            print(f"Error fetching DBLP data for {name}: {e}")
-            return {"error": str(e), "source": "DBLP"}
+            type_ = info.get("type")
+            # Force string for JSON; interned since DBLP has only a handful of types
+            if type_: types_c[sys.intern(str(safe_value(type_)))] += 1
+            
+            venue = info.get("venue")
+            if venue:
+                venues_c.update([venue] if isinstance(venue, str) else venue)
+            
+            cleaned_hits.append({
+                "title": info.get("title"),
+                "year": year,
+                "venue": venue if not isinstance(venue, list) else venue[0], # Just take first if list
+                "type": type_ if not isinstance(type_, list) else type_[0],
+                "url": info.get("url")
+            })
+        
+        venues_top = dict(venues_c.most_common(10))
+        collaborators_top = dict(co_authors.most_common(10))
+        
+        # 5 most recent hits (same result as a stable sort by year desc, without sorting everything)
+        recent = heapq.nlargest(5, cleaned_hits, key=lambda x: int(x["year"]) if x.get("year") else 0)
+
+        return {
+            "found": True,
+            "source": "DBLP",
+            "total_publications": len(hits),
+            "years_distribution": dict(years_c),
+            "types_distribution": dict(types_c),
+            "top_venues": venues_top,
+            "top_collaborators": collaborators_top,
+            "recent_publications": recent
+        }
+        
+    except Exception as e:
+        logger.exception("Error fetching DBLP data for %s", name)
+        return {"error": str(e), "source": "DBLP"}
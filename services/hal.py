@@ -1,29 +1,101 @@
-import httpx
-import urllib.parse
-from collections import Counter
-from typing import Optional
+import asyncio
+import gzip
+import logging
+import os
+import orjson
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+from typing import List, Optional
+from services.cache import ttl_cache
+from services.http import LazyClient
 
 HAL_API_URL = "https://api.archives-ouvertes.fr/search/"
 
+logger = logging.getLogger(__name__)
+
+# Shared pooled client, see services/http.py
+_http = LazyClient()
+get_client = _http.get
+close_hal_client = _http.close
+
+# Caps concurrent HAL requests so dashboard bursts don't trip HAL's rate limiting
+_hal_sem = asyncio.Semaphore(10)
+
+# Solr query-syntax characters, backslash-escaped before user input is put in a query
+_SOLR_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+def _solr_escape(s: str) -> str:
+    return _SOLR_SPECIAL.sub(r'\\\1', s)
+
+# Facet limits for researcher stats (-1 = every value)
+HAL_STATS_FACET_LIMITS = {
+    "producedDateY_i": -1,
+    "docType_s": -1,
+    "keyword_s": 20,
+    "authFullName_s": 11, # Top 10 co-authors + the researcher themself
+    "journalTitle_s": 10
+}
+
+def facet_pairs(flat_list):
+    """Converts a Solr facet list ["2023", 10, "2022", 5] to [("2023", 10), ("2022", 5)]."""
+    it = iter(flat_list)
+    return list(zip(it, it))
+
+def query_key(params):
+    """
+    Hashable cache key for a HAL query given as a dict or a sequence of (key, value) pairs
+    (list values such as facet.field become tuples).
+    """
+    items = params.items() if isinstance(params, dict) else params
+    return (HAL_API_URL, frozenset((k, tuple(v) if isinstance(v, list) else v) for k, v in items))
+
+async def fetch(params):
+    """Runs a query against the HAL search API and returns the decoded JSON."""
+    async with _hal_sem:
+        response = await get_client().get(HAL_API_URL, params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+# HAL results are essentially static within a session: identical queries skip the network
+search = ttl_cache(ttl=3600, maxsize=256, key=query_key)(fetch)
+
+async def fetch_conditional(params, etag: Optional[str] = None, last_modified: Optional[str] = None):
+    """
+    Like fetch(), but revalidates a previous response with If-None-Match / If-Modified-Since.
+    Returns (decoded JSON, response headers), with None instead of the JSON on 304 Not Modified.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with _hal_sem:
+        response = await get_client().get(HAL_API_URL, params=params, headers=headers)
+    if response.status_code == 304:
+        return None, response.headers
+    response.raise_for_status()
+    return orjson.loads(response.content), response.headers
+
 async def get_hal_stats(name: str, start_year: Optional[int] = None, end_year: Optional[int] = None, keyword: Optional[str] = None):
     """
     Fetches statistics for a researcher from HAL API.
+    Counts are computed server-side with Solr facets; only the 5 most recent docs are downloaded.
     """
     # Clean name for query (remove extra spaces)
     clean_name = " ".join(name.split())
     # Query: Search by author name strictly if possible, or text otherwise.
     # authFullName_t is a good field for full name text search.
-    query = f'authFullName_t:"{clean_name}"'
+    query = f'authFullName_t:"{_solr_escape(clean_name)}"'
     
-    # Fields we want to retrieve to build stats
+    # Fields returned for the recent publications
     fl = "title_s,producedDateY_i,docType_s,keyword_s,authFullName_s,journalTitle_s,conferenceTitle_s"
     
-    params = {
+    base_params = {
         "q": query,
-        "wt": "json",
-        "fl": fl,
-        "rows": 500, # Max rows to analyze
-        "sort": "producedDateY_i desc"
+        "wt": "json"
     }
 
     # Filters
@@ -34,108 +106,80 @@ async def get_hal_stats(name: str, start_year: Optional[int] = None, end_year: O
         filters.append(f"producedDateY_i:[{s} TO {e}]")
     
     if keyword:
-        # Quote the keyword to handle spaces, and escape existing quotes if any
-        safe_keyword = keyword.replace('"', '\\"')
-        filters.append(f'keyword_s:"{safe_keyword}"')
-        
+        # Phrase query on the tokenized keyword_t field: case-insensitive match of the
+        # keyword within a document keyword (keyword_s only matches the exact string).
+        # Quote the keyword to handle spaces, and escape Solr special characters
+        filters.append(f'keyword_t:"{_solr_escape(keyword)}"')
+    
+    if filters:
         # Combine filters into a single string with AND
-        params["fq"] = " AND ".join(filters)
+        base_params["fq"] = " AND ".join(filters)
     
-    print(f"DEBUG HAL REQUEST: {HAL_API_URL} with params {params}")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(HAL_API_URL, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            docs = data.get("response", {}).get("docs", [])
-            
-            # --- Manual Fallback Filtering ---
-            # Ensure strict compliance with filters even if API is loose
-            filtered_docs = []
-            for d in docs:
-                # Year Filter
-                y = d.get("producedDateY_i")
-                if start_year and y and y < start_year: continue
-                if end_year and y and y > end_year: continue
-                
-                # Keyword Filter (Case insensitive partial match for robustness)
-                if keyword:
-                    kws = d.get("keyword_s", [])
-                    if isinstance(kws, str): kws = [kws]
-                    # Check if any keyword contains the search term
-                    if not any(keyword.lower() in k.lower() for k in kws):
-                        continue
-                
-                filtered_docs.append(d)
-                
-            docs = filtered_docs
-            # ---------------------------------
-
-            if not docs:
-                return {"found": True, "source": "HAL", "count": 0, "total_publications": 0, "years_distribution": {}, "types_distribution": {}, "top_keywords": {}, "top_collaborators": {}, "top_journals": {}, "recent_publications": []}
+    recent_params = {
+        **base_params,
+        "fl": fl,
+        "rows": 5,
+        "sort": "producedDateY_i desc"
+    }
+    
+    # rows=0: we only need the facet counts, not the documents
+    facet_params = {
+        **base_params,
+        "rows": 0,
+        "facet": "true",
+        "facet.field": list(HAL_STATS_FACET_LIMITS),
+        "facet.mincount": 1
+    }
+    for field, limit in HAL_STATS_FACET_LIMITS.items():
+        facet_params[f"f.{field}.facet.limit"] = limit
+    # Years come back in numeric order instead of by count
+    facet_params["f.producedDateY_i.facet.sort"] = "index"
+    
+    logger.debug("HAL request: %s params=%s", HAL_API_URL, base_params)
 
-            # Process Stats
-            years = []
-            types = []
-            keywords = []
-            co_authors = []
-            journals = []
-            
-            researcher_name_lower = name.lower()
+    try:
+        recent_data, facet_data = await asyncio.gather(search(recent_params), search(facet_params))
+        
+        total = facet_data.get("response", {}).get("numFound", 0)
+        if not total:
+            return {"found": True, "source": "HAL", "count": 0, "total_publications": 0, "years_distribution": {}, "types_distribution": {}, "top_keywords": {}, "top_collaborators": {}, "top_journals": {}, "recent_publications": []}
 
-            for d in docs:
-                # Years
-                if d.get("producedDateY_i"):
-                    years.append(d.get("producedDateY_i"))
-                
-                # Types
-                if d.get("docType_s"):
-                    types.append(d.get("docType_s"))
-                
-                # Keywords
-                if d.get("keyword_s"):
-                    if isinstance(d.get("keyword_s"), list):
-                        keywords.extend(d.get("keyword_s"))
-                    else:
-                        keywords.append(d.get("keyword_s"))
+        facets = facet_data.get("facet_counts", {}).get("facet_fields", {})
+        
+        # Most recent year first
+        years_dist = {int(y): c for y, c in reversed(facet_pairs(facets.get("producedDateY_i", [])))}
+        # Tiny vocabulary (ART, COMM, THESE...): interned so repeats share one string
+        types_dist = {sys.intern(t): c for t, c in facet_pairs(facets.get("docType_s", []))}
+        
+        # Top Lists (Solr returns them sorted by count)
+        keywords_top = dict(facet_pairs(facets.get("keyword_s", [])))
+        researcher_name_cf = name.casefold()
+        collaborators_top = dict([(a, c) for a, c in facet_pairs(facets.get("authFullName_s", [])) if a.casefold() != researcher_name_cf][:10])
+        journals_top = dict(facet_pairs(facets.get("journalTitle_s", [])))
+        
+        return {
+            "found": True,
+            "source": "HAL",
+            "total_publications": total,
+            "years_distribution": years_dist,
+            "types_distribution": types_dist,
+            "top_keywords": keywords_top,
+            "top_collaborators": collaborators_top,
+            "top_journals": journals_top,
+            "recent_publications": recent_data.get("response", {}).get("docs", [])
+        }
+        
+    except Exception as e:
+        logger.exception("Error fetching HAL data for %s", name)
+        return {"error": str(e), "source": "HAL"}
 
-                # Co-authors (exclude self)
-                if d.get("authFullName_s"):
-                    authors = d.get("authFullName_s")
-                    if isinstance(authors, str): authors = [authors]
-                    for auth in authors:
-                        if auth.lower() != researcher_name_lower:
-                            co_authors.append(auth)
-                            
-                # Journals
-                if d.get("journalTitle_s"):
-                    journals.append(d.get("journalTitle_s"))
-            
-            # Count aggregations
-            years_dist = dict(Counter(years))
-            types_dist = dict(Counter(types))
-            
-            # Top Lists
-            keywords_top = dict(Counter(keywords).most_common(20))
-            collaborators_top = dict(Counter(co_authors).most_common(10))
-            journals_top = dict(Counter(journals).most_common(10))
-            
-            return {
-                "found": True,
-                "source": "HAL",
-                "total_publications": len(docs),
-                "years_distribution": years_dist,
-                "types_distribution": types_dist,
-                "top_keywords": keywords_top,
-                "top_collaborators": collaborators_top,
-                "top_journals": journals_top,
-                "recent_publications": docs[:5] # Top 5 recent
-            }
-            
-        except Exception as e:
-            print(f"Error fetching HAL data for {name}: {e}")
-            return {"error": str(e), "source": "HAL"}
+async def get_hal_stats_many(names: List[str], start_year: Optional[int] = None, end_year: Optional[int] = None, keyword: Optional[str] = None):
+    """
+    Fetches HAL statistics for several researchers at once.
+    Requests are multiplexed over the shared HTTP/2 connection (bounded by _hal_sem);
+    results are returned in the order of `names`.
+    """
+    return await asyncio.gather(*(get_hal_stats(n, start_year, end_year, keyword) for n in names))
 
 async def get_project_stats(project_name: str):
     """
@@ -144,8 +188,11 @@ async def get_project_stats(project_name: str):
     # Search in all text fields for the project acronym. 
     # Ideally checking specific fields like 'funding_s' or 'collaboration_s' is better but inconsistent.
     # We will use a general search for the acronym.
-    query = f'"{project_name}"'
+    if not project_name:
+        return {"found": False, "count": 0}
+    query = f'"{_solr_escape(project_name)}"'
     
+    # Only the fields we actually use (stats + the 5 recent publications)
     fl = "title_s,producedDateY_i,docType_s,authFullName_s,journalTitle_s"
     
     params = {
@@ -156,115 +203,203 @@ async def get_project_stats(project_name: str):
         "sort": "producedDateY_i desc"
     }
     
-    async with httpx.AsyncClient() as client:
+    try:
+        data = await search(params)
+        docs = data.get("response", {}).get("docs", [])
+        
+        if not docs:
+            return {"found": False, "count": 0}
+
+        # Stats (histograms computed by numpy.unique)
+        years_arr = np.fromiter((y for y in (d.get("producedDateY_i") for d in docs) if y), dtype=np.int32)
+        y_vals, y_counts = np.unique(years_arr, return_counts=True)
+        # Most recent year first
+        years_dist = dict(zip(y_vals[::-1].tolist(), y_counts[::-1].tolist()))
+        
+        authors = []
+        for d in docs:
+            a = d.get("authFullName_s")
+            if a:
+                authors.extend([a] if isinstance(a, str) else a)
+        
+        a_vals, a_first, a_counts = np.unique(np.asarray(authors, dtype=object), return_index=True, return_counts=True)
+        # Ties keep first-seen order (most recent docs first), as Counter.most_common did
+        top = np.lexsort((a_first, -a_counts))[:10]
+        top_authors = dict(zip(a_vals[top].tolist(), a_counts[top].tolist()))
+        
+        return {
+            "found": True,
+            "total_publications": len(docs),
+            "years_distribution": years_dist,
+            "top_authors": top_authors,
+            "recent_publications": docs[:5]
+        }
+
+    except Exception as e:
+        logger.exception("Error fetching HAL project data for %s", project_name)
+        return {"error": str(e)}
+
+# Casefolded substrings identifying LISTIC itself in structName_s facets
+LAB_NAME_MARKERS = ("listic", "laboratoire d'informatique")
+
+# Static part of the get_listic_stats query, encoded once at import; only `fq` varies per call.
+# We use rows=0 because we only care about facets (counts), not the documents themselves.
+_LISTIC_BASE_PARAMS = (
+    ("q", 'structAcronym_s:"LISTIC"'),
+    ("wt", "json"),
+    ("rows", "0"),
+    ("facet", "true"),
+    *[("facet.field", f) for f in (
+        "producedDateY_i",
+        "keyword_s",
+        "docType_s",
+        "authFullName_s",
+        "journalTitle_s",
+        "language_s",
+        "structName_s"
+    )],
+    ("facet.limit", "50"), # Get top 50
+    ("facet.mincount", "1"),
+    # Every year, in numeric order (the other facets stay top-50 by count)
+    ("f.producedDateY_i.facet.limit", "-1"),
+    ("f.producedDateY_i.facet.sort", "index")
+)
+
+# On-disk cache of the lab-level stats: survives restarts, revalidated with HAL's ETag/Last-Modified
+LISTIC_CACHE_DIR = os.path.expanduser(os.getenv("LISTIC_CACHE_DIR", "~/.cache/listic"))
+# Cached stats younger than this are served without contacting HAL
+LISTIC_CACHE_TTL = 86400
+# Year ranges come from the caller, so the number of cached files is capped
+LISTIC_CACHE_MAX_FILES = 64
+
+def read_disk_cache(path: str):
+    """Returns the cache entry stored at `path`, or None if it is missing, unreadable or malformed."""
+    try:
+        with gzip.open(path, "rb") as f:
+            entry = orjson.loads(f.read())
+    except Exception:
+        # Corrupt gzip/deflate stream (zlib.error), truncated file, invalid JSON...: a cache miss,
+        # so the next fetch rewrites the file
+        return None
+    if not (isinstance(entry, dict) and isinstance(entry.get("fetched_at"), (int, float)) and "result" in entry):
+        return None
+    return entry
+
+def write_disk_cache(path: str, entry: dict):
+    directory = os.path.dirname(path)
+    tmp_path = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a unique temp file then rename: concurrent writers never share a file
+        # and a concurrent reader never sees a partial one
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+            with gzip.GzipFile(fileobj=tmp, mode="wb") as f:
+                f.write(orjson.dumps(entry))
+        os.replace(tmp_path, path)
+        tmp_path = None
+    except OSError:
+        logger.warning("Could not write LISTIC stats cache %s", path, exc_info=True)
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    prune_disk_cache(directory)
+
+def prune_disk_cache(directory: str):
+    """Keeps only the LISTIC_CACHE_MAX_FILES most recently written stats files (one per year range)."""
+    try:
+        with os.scandir(directory) as it:
+            files = [e for e in it if e.name.startswith("listic_stats_") and e.name.endswith(".json.gz")]
+        files.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for e in files[LISTIC_CACHE_MAX_FILES:]:
         try:
-            response = await client.get(HAL_API_URL, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            docs = data.get("response", {}).get("docs", [])
-            
-            if not docs:
-                return {"found": False, "count": 0}
+            os.remove(e.path)
+        except OSError:
+            pass
+
+def parse_listic_stats(data: dict):
+    """Builds the lab stats response from a HAL facet query result."""
+    facet_counts = data.get("facet_counts", {}).get("facet_fields", {})
+    
+    # Helper to convert ["2023", 10, "2022", 5] list to [{"name": "2023", "value": 10}, ...]
+    def parse_facet(flat_list, intern_names=False):
+        # zip over a single iterator pairs consecutive items
+        it = iter(flat_list)
+        # Low-cardinality names (doc types, languages) are interned so repeats share one string
+        to_name = (lambda n: sys.intern(str(n))) if intern_names else str
+        return [{"name": to_name(n), "value": v} for n, v in zip(it, it)]
 
-            # Stats
-            years = [d.get("producedDateY_i") for d in docs if d.get("producedDateY_i")]
-            authors = []
-            for d in docs:
-                if d.get("authFullName_s"):
-                    a = d.get("authFullName_s")
-                    if isinstance(a, list): authors.extend(a)
-                    else: authors.append(a)
-            
-            years_dist = dict(Counter(years))
-            top_authors = dict(Counter(authors).most_common(10))
-            
-            return {
-                "found": True,
-                "total_publications": len(docs),
-                "years_distribution": years_dist,
-                "top_authors": top_authors,
-                "recent_publications": docs[:5]
-            }
+    years_data = parse_facet(facet_counts.get("producedDateY_i", []))
+    keywords_data = parse_facet(facet_counts.get("keyword_s", []))
+    types_data = parse_facet(facet_counts.get("docType_s", []), intern_names=True)
+    authors_data = parse_facet(facet_counts.get("authFullName_s", []))
+    journals_data = parse_facet(facet_counts.get("journalTitle_s", []))
+    languages_data = parse_facet(facet_counts.get("language_s", []), intern_names=True)
+    structures_data = parse_facet(facet_counts.get("structName_s", []))
+    
+    # Post-process structures to exclude "LISTIC" itself from collaborators list
+    structures_data = [s for s in structures_data if not any(m in s["name"].casefold() for m in LAB_NAME_MARKERS)]
+    
+    return {
+        "years": years_data,
+        "keywords": keywords_data,
+        "types": types_data,
+        "authors": authors_data,
+        "journals": journals_data,
+        "languages": languages_data,
+        "structures": structures_data,
+        "total_docs": data.get("response", {}).get("numFound", 0)
+    }
 
-        except Exception as e:
-            print(f"Error fetching HAL project data for {project_name}: {e}")
-            return {"error": str(e)}
 async def get_listic_stats(start_year: Optional[int] = None, end_year: Optional[int] = None):
     """
     Fetches global statistics for the LISTIC lab using Facets.
     Supports optional year filtering.
+    Results are persisted gzipped in LISTIC_CACHE_DIR and revalidated with HAL once stale.
+    No in-memory layer on top: it would pin stale fallbacks and stack on the disk TTL.
     """
-    query = 'structAcronym_s:"LISTIC"'
-    
-    # We use rows=0 because we only care about facets (counts), not the documents themselves.
-    params = {
-        "q": query,
-        "wt": "json",
-        "rows": 0,
-        "facet": "true",
-        "facet.field": [
-            "producedDateY_i",
-            "keyword_s",
-            "docType_s",
-            "authFullName_s",
-            "journalTitle_s",
-            "language_s",
-            "structName_s"
-        ],
-        "facet.limit": 50, # Get top 50
-        "facet.mincount": 1
-    }
+    params = _LISTIC_BASE_PARAMS
     
     # Add Filter Query for date range if provided
     if start_year or end_year:
         # Default boundary if one side missing
         s = start_year if start_year else "*"
         e = end_year if end_year else "*"
-        params["fq"] = f"producedDateY_i:[{s} TO {e}]"
+        params += (("fq", f"producedDateY_i:[{s} TO {e}]"),)
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(HAL_API_URL, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            
-            facet_counts = data.get("facet_counts", {}).get("facet_fields", {})
-            
-            # Helper to convert ["2023", 10, "2022", 5] list to [{"name": "2023", "value": 10}, ...]
-            def parse_facet(flat_list):
-                res = []
-                for i in range(0, len(flat_list), 2):
-                    res.append({
-                        "name": str(flat_list[i]),
-                        "value": flat_list[i+1]
-                    })
-                return res
-
-            years_data = parse_facet(facet_counts.get("producedDateY_i", []))
-            keywords_data = parse_facet(facet_counts.get("keyword_s", []))
-            types_data = parse_facet(facet_counts.get("docType_s", []))
-            authors_data = parse_facet(facet_counts.get("authFullName_s", []))
-            journals_data = parse_facet(facet_counts.get("journalTitle_s", []))
-            languages_data = parse_facet(facet_counts.get("language_s", []))
-            structures_data = parse_facet(facet_counts.get("structName_s", []))
-            
-            # Post-process structures to exclude "LISTIC" itself from collaborators list
-            structures_data = [s for s in structures_data if "LISTIC" not in s["name"].upper() and "LABORATOIRE D'INFORMATIQUE" not in s["name"].upper()]
-
-            # Sort years numerically
-            years_data.sort(key=lambda x: int(x["name"]) if x["name"].isdigit() else 0)
-            
-            return {
-                "years": years_data,
-                "keywords": keywords_data,
-                "types": types_data,
-                "authors": authors_data,
-                "journals": journals_data,
-                "languages": languages_data,
-                "structures": structures_data,
-                "total_docs": data.get("response", {}).get("numFound", 0)
-            }
-            
-        except Exception as e:
-            print(f"Error fetching LISTIC global stats: {e}")
-            return {"error": str(e)}
+    cache_path = os.path.join(LISTIC_CACHE_DIR, f"listic_stats_{start_year or 'all'}_{end_year or 'all'}.json.gz")
+    cached = None
+    
+    try:
+        cached = await asyncio.to_thread(read_disk_cache, cache_path)
+        if cached and time.time() - cached["fetched_at"] < LISTIC_CACHE_TTL:
+            return cached["result"]
+        
+        data, headers = await fetch_conditional(
+            params,
+            etag=cached.get("etag") if cached else None,
+            last_modified=cached.get("last_modified") if cached else None
+        )
+        # None means 304 Not Modified: the cached stats are still current
+        result = cached["result"] if data is None else parse_listic_stats(data)
+        
+        # A 304 may omit the validators, keep the previous ones then
+        await asyncio.to_thread(write_disk_cache, cache_path, {
+            "etag": headers.get("ETag") or (cached.get("etag") if cached else None),
+            "last_modified": headers.get("Last-Modified") or (cached.get("last_modified") if cached else None),
+            "fetched_at": time.time(),
+            "result": result
+        })
+        return result
+        
+    except Exception as e:
+        logger.exception("Error fetching LISTIC global stats")
+        # Serve the stale stats rather than the error when HAL is unreachable
+        if cached:
+            return cached["result"]
+        return {"error": str(e)}
@@ -0,0 +1,33 @@
+import httpx
+from typing import Optional
+
+
+def make_client() -> httpx.AsyncClient:
+    """
+    Pooled HTTP/2 client with the settings shared by the HAL and DBLP services.
+    httpx advertises `br` in Accept-Encoding on its own when `brotli` is installed.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=httpx.Timeout(10.0, connect=3.0)
+    )
+
+
+class LazyClient:
+    """
+    Holds one shared client per upstream API so calls reuse pooled connections instead of
+    re-doing DNS + TLS for every request. Created on first use, closed on app shutdown.
+    """
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def get(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = make_client()
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None